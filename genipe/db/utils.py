@@ -5,9 +5,12 @@
 
 
 import os
+import atexit
 import logging
 import sqlite3
+import threading
 from datetime import datetime
+from contextlib import contextmanager
 
 
 __author__ = "Louis-Philippe Lemieux Perreault"
@@ -17,20 +20,77 @@ __license__ = "Attribution-NonCommercial 4.0 International (CC BY-NC 4.0)"
 
 __all__ = ["create_task_db", "check_task_completion", "create_task_entry",
            "mark_task_completed", "mark_task_incomplete", "get_task_runtime",
-           "get_all_runtimes", "mark_drmaa_task_completed"]
-
-
-def create_task_db(out_dir):
+           "get_all_runtimes", "mark_drmaa_task_completed",
+           "mark_drmaa_tasks_completed", "close_task_db",
+           "task_db_transaction"]
+
+
+# The cached DB connections (one per thread)
+_connections = threading.local()
+
+# The current local time (computed by the DB, in the same format as the
+# datetime adapter, with milliseconds)
+_NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')"
+
+# The statements used by the helpers (the statement cache of a connection is
+# keyed on the SQL text, so that those are only compiled once)
+_SELECT_COMPLETED = "SELECT completed FROM genipe_task WHERE name=?"
+_SELECT_TASK = "SELECT name FROM genipe_task WHERE name=?"
+_UPSERT_TASK = ("INSERT INTO genipe_task (name, launch, start) "
+                "VALUES (?, " + _NOW + ", " + _NOW + ") "
+                "ON CONFLICT(name) DO UPDATE SET launch=excluded.launch, "
+                "start=excluded.start, completed=0")
+_INSERT_TASK = ("INSERT INTO genipe_task (name, launch, start) "
+                "VALUES (?, " + _NOW + ", " + _NOW + ")")
+_UPDATE_RELAUNCHED = ("UPDATE genipe_task "
+                      "SET launch=" + _NOW + ", start=" + _NOW + ", "
+                      "completed=0 WHERE name=?")
+_UPDATE_COMPLETED = ("UPDATE genipe_task SET end=" + _NOW + ", completed=1 "
+                     "WHERE name=?")
+_UPDATE_INCOMPLETE = "UPDATE genipe_task SET completed=0 WHERE name=?"
+_UPDATE_DRMAA_COMPLETED = ("UPDATE genipe_task "
+                           "SET launch=?, start=?, end=?, completed=1 "
+                           "WHERE name=?")
+_RUNTIME = "CAST(ROUND((julianday(end) - julianday(start)) * 86400) AS INT)"
+_SELECT_RUNTIME = ("SELECT " + _RUNTIME + " FROM genipe_task WHERE name=? "
+                   "LIMIT 1")
+_SELECT_ALL_RUNTIMES = ("SELECT name, " + _RUNTIME + " FROM genipe_task "
+                        "WHERE start IS NOT NULL AND end IS NOT NULL")
+_SELECT_NO_RUNTIME = ("SELECT name FROM genipe_task "
+                      "WHERE start IS NULL OR end IS NULL")
+
+# UPSERT is only available since SQLite 3.24.0
+_HAS_UPSERT = sqlite3.sqlite_version_info >= (3, 24, 0)
+
+# The number of statements cached by each connection
+_CACHED_STATEMENTS = 128
+
+# The PRAGMAs set on each connection (20 MB of cache)
+_CONNECTION_PRAGMAS = ("temp_store=MEMORY", "cache_size=-20000",
+                       "mmap_size=268435456")
+
+
+def create_task_db(out_dir, wal=True):
     """Creates a task DB.
 
     Args:
         out_dir (str): the directory where the DB will be saved
+        wal (bool): whether to use the write-ahead log (WAL) journal mode
 
     Returns:
         str: the name of the file containing the DB
 
     A SQLITE database will be created in the ``out_dir`` directory (with the
-    name ``tasks.db``. The ``genipe_task`` table is automatically created.
+    name ``tasks.db``. The ``genipe_task`` table (and an index on its
+    ``completed`` column) is automatically created.
+
+    Note
+    ----
+        The write-ahead log journal mode (WAL) is persistent and requires the
+        DB (hence ``out_dir``) to be on a local file system (WAL doesn't work
+        over a network file system such as NFS or Lustre). If ``wal`` is
+        ``False``, the default rollback journal is used (even if the DB
+        previously used WAL).
 
     """
     # The name
@@ -40,6 +100,16 @@ def create_task_db(out_dir):
     # The DB
     conn, c = _create_db_connection(db_name)
 
+    # Setting the journal mode (persistent for the DB file)
+    expected_mode = "wal" if wal else "delete"
+    mode = c.execute(
+        "PRAGMA journal_mode={}".format(expected_mode),
+    ).fetchone()[0]
+    if mode != expected_mode:
+        logging.warning("{}: journal mode is '{}' (instead of '{}')".format(
+            db_name, mode, expected_mode,
+        ))
+
     # Creating the table if it doesn't exists
     c.execute("""CREATE TABLE IF NOT EXISTS genipe_task (
                     name TEXT PRIMARY KEY,
@@ -48,6 +118,10 @@ def create_task_db(out_dir):
                     end TIMESTAMP,
                     completed INT)""")
 
+    # Indexing the completion (for sweeps on completed/pending tasks)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_task_completed "
+              "ON genipe_task (completed)")
+
     # Committing the changes
     conn.commit()
     conn.close()
@@ -55,27 +129,170 @@ def create_task_db(out_dir):
     return db_name
 
 
-def _create_db_connection(db_name):
+def _create_db_connection(db_name, typed=True):
     """Creates a DB connection.
 
     Args:
         db_name (str): the name of the database (usually a file)
+        typed (bool): whether to convert the values according to the declared
+                      types (e.g. ``TIMESTAMP`` to :py:class:`datetime`)
 
     Returns:
         tuple: a tuple containing the connection object and a cursor to that
                object
 
     """
+    detect_types = 0
+    if typed:
+        detect_types = sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES
+
     conn = sqlite3.connect(
         db_name,
         timeout=1800,
-        detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+        cached_statements=_CACHED_STATEMENTS,
+        detect_types=detect_types,
     )
     c = conn.cursor()
 
+    # Tuning the connection (those are not persistent)
+    for pragma in _CONNECTION_PRAGMAS:
+        c.execute("PRAGMA {}".format(pragma))
+
+    # Fewer syncs are only safe using the write-ahead log
+    if c.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+        c.execute("PRAGMA synchronous=NORMAL")
+
     return conn, c
 
 
+def _get_db_connection(db_name):
+    """Gets the cached DB connection (creating it if required).
+
+    Args:
+        db_name (str): the name of the database (usually a file)
+
+    Returns:
+        sqlite3.Connection: the connection to the database
+
+    Note
+    ----
+        Connections are cached per thread and per process. A connection
+        inherited from a parent process (after a fork) is never reused.
+
+    Note
+    ----
+        The values aren't converted according to their declared types (the
+        helpers don't need :py:class:`datetime` objects, since the run times
+        are computed by the DB).
+
+    """
+    pid = os.getpid()
+    if getattr(_connections, "pid", None) != pid:
+        _connections.pid = pid
+        _connections.cache = {}
+        _connections.transactions = set()
+
+    conn = _connections.cache.get(db_name)
+    if conn is None:
+        conn, c = _create_db_connection(db_name, typed=False)
+        _connections.cache[db_name] = conn
+
+    return conn
+
+
+def close_task_db(db_name):
+    """Closes the cached connection to a task DB (for the current thread).
+
+    Args:
+        db_name (str): the name of the DB (usually a file)
+
+    Nothing is done if there is no cached connection to the DB.
+
+    """
+    if getattr(_connections, "pid", None) != os.getpid():
+        return
+
+    conn = _connections.cache.pop(db_name, None)
+    if conn is not None:
+        conn.close()
+
+
+@contextmanager
+def task_db_transaction(db_name):
+    """Groups the changes made by the helpers in a single transaction.
+
+    Args:
+        db_name (str): the name of the DB (usually a file)
+
+    The helpers (e.g. :py:func:`create_task_entry`) called in the context
+    (in the same thread) don't commit their changes. The transaction is
+    committed at the end of the context (or rolled back if an exception is
+    raised), so that only one commit is required for many tasks.
+
+    .. code-block:: python
+
+        with task_db_transaction(db_name):
+            for task_id in task_ids:
+                create_task_entry(task_id, db_name)
+
+    Nested contexts are part of the outer transaction.
+
+    """
+    conn = _get_db_connection(db_name)
+
+    if db_name in _connections.transactions:
+        # Already in a transaction
+        yield
+        return
+
+    # Starting the transaction (taking the write lock right away)
+    conn.execute("BEGIN IMMEDIATE")
+    _connections.transactions.add(db_name)
+
+    try:
+        yield
+
+    except BaseException:
+        conn.rollback()
+        raise
+
+    else:
+        conn.commit()
+
+    finally:
+        _connections.transactions.discard(db_name)
+
+
+@contextmanager
+def _write_transaction(db_name):
+    """Gets the cached DB connection for changes made by a helper.
+
+    Args:
+        db_name (str): the name of the DB (usually a file)
+
+    The changes are committed (or rolled back) at the end of the context,
+    unless the helper was called inside :py:func:`task_db_transaction`.
+
+    """
+    conn = _get_db_connection(db_name)
+
+    if db_name in _connections.transactions:
+        # The outer transaction will commit the changes
+        yield conn
+        return
+
+    with conn:
+        yield conn
+
+
+@atexit.register
+def _close_all_task_db():
+    """Closes all the cached connections (for the current thread)."""
+    if getattr(_connections, "pid", None) == os.getpid():
+        for db_name in list(_connections.cache.keys()):
+            close_task_db(db_name)
+
+
 def check_task_completion(task_id, db_name):
     """Checks if the task exists and if it's completed.
 
@@ -93,13 +310,10 @@ def check_task_completion(task_id, db_name):
         completed otherwise.
 
     """
-    conn, c = _create_db_connection(db_name)
+    conn = _get_db_connection(db_name)
 
     # Retrieving the task information
-    c.execute("SELECT completed FROM genipe_task WHERE name=?", (task_id, ))
-    r = c.fetchone()
-
-    conn.close()
+    r = conn.execute(_SELECT_COMPLETED, (task_id, )).fetchone()
 
     if r is None:
         # There is not entry with this task ID
@@ -129,29 +343,25 @@ def create_task_entry(task_id, db_name):
     launch and start time) and ``completed`` is set to ``0``.
 
     """
-    conn, c = _create_db_connection(db_name)
+    # The time of launch is set by the DB
+    with _write_transaction(db_name) as conn:
+        if _HAS_UPSERT:
+            # Creating the entry, or updating it if it already exists
+            conn.execute(_UPSERT_TASK, (task_id, ))
+            return
 
-    # Checking if the entry already exists
-    c.execute("SELECT name FROM genipe_task WHERE name=?", (task_id, ))
-    r = c.fetchone()
+        # Checking if the entry already exists
+        r = conn.execute(_SELECT_TASK, (task_id, )).fetchone()
 
-    # The time of launch
-    time = datetime.now()
+        if r is None:
+            # This is the first time we see this task, so we create an new
+            # entry
+            conn.execute(_INSERT_TASK, (task_id, ))
 
-    if r is None:
-        # This is the first time we see this task, so we create an new entry
-        c.execute("INSERT INTO genipe_task (name, launch, start) "
-                  "VALUES (?, ?, ?)",
-                  (task_id, time, time))
-
-    else:
-        # We saw this task, but we need to relaunch it (setting completed=0)
-        c.execute("UPDATE genipe_task "
-                  "SET launch=?, start=?, completed=0 WHERE name=?",
-                  (time, time, task_id))
-
-    conn.commit()
-    conn.close()
+        else:
+            # We saw this task, but we need to relaunch it (setting
+            # completed=0)
+            conn.execute(_UPDATE_RELAUNCHED, (task_id, ))
 
 
 def mark_task_completed(task_id, db_name):
@@ -165,14 +375,9 @@ def mark_task_completed(task_id, db_name):
     updated to the current time.
 
     """
-    conn, c = _create_db_connection(db_name)
-
-    # Updating the end time
-    c.execute("UPDATE genipe_task SET end=?, completed=1 WHERE name=?",
-              (datetime.now(), task_id))
-
-    conn.commit()
-    conn.close()
+    # Updating the end time (set by the DB)
+    with _write_transaction(db_name) as conn:
+        conn.execute(_UPDATE_COMPLETED, (task_id, ))
 
 
 def mark_task_incomplete(task_id, db_name):
@@ -186,13 +391,9 @@ def mark_task_incomplete(task_id, db_name):
     ``0``.
 
     """
-    conn, c = _create_db_connection(db_name)
-
     # Setting the completion to 0 for this task
-    c.execute("UPDATE genipe_task SET completed=0 WHERE name=?", (task_id, ))
-
-    conn.commit()
-    conn.close()
+    with _write_transaction(db_name) as conn:
+        conn.execute(_UPDATE_INCOMPLETE, (task_id, ))
 
 
 def mark_drmaa_task_completed(task_id, launch_time, start_time, end_time,
@@ -213,19 +414,32 @@ def mark_drmaa_task_completed(task_id, launch_time, start_time, end_time,
     time that the job was completed.
 
     """
-    conn, c = _create_db_connection(db_name)
+    mark_drmaa_tasks_completed(
+        [(task_id, launch_time, start_time, end_time)], db_name,
+    )
 
-    # The time
-    launch_time = datetime.fromtimestamp(launch_time)
-    start_time = datetime.fromtimestamp(start_time)
-    end_time = datetime.fromtimestamp(end_time)
 
-    # Updating
-    c.execute("UPDATE genipe_task SET launch=?, start=?, end=?, completed=1 "
-              "WHERE name=?", (launch_time, start_time, end_time, task_id))
+def mark_drmaa_tasks_completed(tasks, db_name):
+    """Marks multiple tasks run by DRMAA as completed (in one transaction).
 
-    conn.commit()
-    conn.close()
+    Args:
+        tasks (list): the tasks (tuples containing the ID of the task, and the
+                      launch, start and end times according to DRMAA)
+        db_name (str): the name of the DB (usually a file)
+
+    See :py:func:`mark_drmaa_task_completed` for more information.
+
+    """
+    # Updating (converting the times)
+    with _write_transaction(db_name) as conn:
+        conn.executemany(
+            _UPDATE_DRMAA_COMPLETED,
+            ((datetime.fromtimestamp(launch_time),
+              datetime.fromtimestamp(start_time),
+              datetime.fromtimestamp(end_time),
+              task_id)
+             for task_id, launch_time, start_time, end_time in tasks),
+        )
 
 
 def get_task_runtime(task_id, db_name):
@@ -239,15 +453,12 @@ def get_task_runtime(task_id, db_name):
         int: the execution time of the task (in seconds)
 
     """
-    conn, c = _create_db_connection(db_name)
+    conn = _get_db_connection(db_name)
 
-    # Getting the start and end time
-    c.execute("SELECT start, end FROM genipe_task WHERE name=?", (task_id, ))
-    r = c.fetchone()
-
-    conn.close()
+    # Computing the execution time
+    r = conn.execute(_SELECT_RUNTIME, (task_id, )).fetchone()
 
-    return int(round((r[1] - r[0]).total_seconds(), ndigits=0))
+    return r[0]
 
 
 def get_all_runtimes(db_name):
@@ -263,22 +474,11 @@ def get_all_runtimes(db_name):
     time (in second) (int).
 
     """
-    conn, c = _create_db_connection(db_name)
-
-    # Getting the start and end time
-    c.execute("SELECT name, start, end FROM genipe_task")
-    r = c.fetchall()
-
-    conn.close()
-
-    # Computing the execution time
-    final = {}
-    for entry in r:
-        name, start, end = entry
-        if (start is None) or (end is None):
-            logging.warning("{}: no execution time for task".format(name))
-            continue
+    conn = _get_db_connection(db_name)
 
-        final[name] = int(round((end - start).total_seconds(), ndigits=0))
+    # The tasks without start or end time
+    for name, in conn.execute(_SELECT_NO_RUNTIME):
+        logging.warning("{}: no execution time for task".format(name))
 
-    return final
+    # Computing the execution time (by the DB)
+    return dict(conn.execute(_SELECT_ALL_RUNTIMES).fetchall())
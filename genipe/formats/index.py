@@ -7,6 +7,7 @@
 import io
 import os
 import zlib
+import mmap
 import logging
 
 import numpy as np
@@ -25,12 +26,46 @@ __all__ = ["get_index", "get_open_func"]
 
 _CHECK_STRING = b"GENIPE INDEX FILE"
 
+# The check string of the index files compressed using zstandard (it doesn't
+# start with the original check string, so that older versions reject it)
+_CHECK_STRING_V2 = b"GENIPE INDEX v2\n"
+
+# The check string of the index files serialized as an Arrow IPC stream
+_CHECK_STRING_V3 = b"GENIPE INDEX v3\n"
+
+# The zstandard compression level
+_ZSTD_LEVEL = 3
+
 try:
     from Bio.bgzf import BgzfReader
     HAS_BIOPYTHON = True
 except ImportError:
     HAS_BIOPYTHON = False
 
+# Reading one BGZF block at a time requires a private BioPython function
+try:
+    from Bio.bgzf import _load_bgzf_block
+    HAS_BGZF_BLOCKS = True
+except ImportError:
+    HAS_BGZF_BLOCKS = False
+
+try:
+    import zstandard as zstd
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+try:
+    import pyarrow as pa
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+
+class _UnreadableIndexError(GenipeError):
+    """The index is in a format that can't be read (missing dependency)."""
+    pass
+
 
 def _seek_generator(f):
     """Yields seek position for each line.
@@ -44,7 +79,153 @@ def _seek_generator(f):
         yield f.tell()
 
 
-def generate_index(fn, cols=None, names=None, sep=" "):
+class _NewLineScanner(object):
+    """Locates the new lines of a file while it's being read.
+
+    Args:
+        f (file): the file object (opened in binary mode)
+
+    The scanner is given to :py:func:`pandas.read_csv` instead of the file, so
+    that the seek position of each line is found from the chunks read by the
+    parser (using numpy), without reading the file a second time.
+
+    """
+    def __init__(self, f):
+        """Construction of the _NewLineScanner class."""
+        self._f = f
+
+        # The position of the end of the data read so far
+        self._end = 0
+
+        # The position following each new line (by chunk)
+        self._positions = [np.zeros(1, dtype=np.uint64)]
+        self._nb_positions = 1
+        self._last_position = 0
+
+    def _add_positions(self, positions):
+        """Adds the positions following the new lines of a chunk."""
+        if len(positions) > 0:
+            self._positions.append(positions)
+            self._nb_positions += len(positions)
+            self._last_position = int(positions[-1])
+
+    def read(self, size=-1):
+        """Reads a chunk of the file (locating its new lines)."""
+        chunk = self._f.read(size)
+        new_lines = np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == 10)
+        positions = new_lines.astype(np.uint64)
+        positions += self._end + 1
+        self._add_positions(positions)
+        self._end += len(chunk)
+        return chunk
+
+    def __iter__(self):
+        """Required for pandas to consider the scanner as a file."""
+        return self
+
+    def __next__(self):
+        """The scanner can only be read by chunks."""
+        raise io.UnsupportedOperation("read the scanner by chunks")
+
+    def get_seek_positions(self, nb_lines):
+        """Gets the seek position of each line read so far.
+
+        Args:
+            nb_lines (int): the number of lines (as parsed)
+
+        Returns:
+            numpy.ndarray: the seek position of each line
+
+        """
+        # There is no line after the last new line (at the end of the file)
+        nb_positions = self._nb_positions
+        if self._last_position == self._end:
+            nb_positions -= 1
+        assert nb_positions == nb_lines, "invalid number of lines"
+
+        # Filling the seek positions (without intermediate copy)
+        positions = np.empty(nb_lines, dtype=np.uint64)
+        i = 0
+        for chunk_positions in self._positions:
+            n = min(len(chunk_positions), nb_lines - i)
+            positions[i:i + n] = chunk_positions[:n]
+            i += n
+
+        return positions
+
+
+class _BgzfNewLineScanner(_NewLineScanner):
+    """Locates the new lines of a BGZF file while it's being decompressed.
+
+    Args:
+        f (file): the file object (opened in binary mode, **not** decompressed)
+
+    The file is decompressed one BGZF block at a time. The new lines of a
+    block are located using numpy, and the seek positions are the virtual
+    offsets (the start of the compressed block shifted by 16 bits, and the
+    position in the decompressed block), as told by
+    :py:meth:`Bio.bgzf.BgzfReader.tell`.
+
+    """
+    def read(self, size=-1):
+        """Reads (and decompresses) the next BGZF block."""
+        while True:
+            block_start = self._f.tell()
+            try:
+                block_size, data = _load_bgzf_block(self._f)
+            except StopIteration:
+                return b""
+
+            # Skipping empty blocks (such as the EOF marker)
+            if len(data) > 0:
+                break
+
+        new_lines = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 10)
+        positions = new_lines.astype(np.uint64)
+        positions += (block_start << 16) + 1
+
+        # A line following the end of a block starts in the next one
+        self._end = (block_start + block_size) << 16
+        if len(new_lines) > 0 and new_lines[-1] + 1 == len(data):
+            positions[-1] = self._end
+
+        self._add_positions(positions)
+        return data
+
+
+class _CompressedWriter(io.RawIOBase):
+    """Compresses the bytes written to it into a file.
+
+    Args:
+        f (file): the file object (opened in binary mode)
+        compressor (object): the compression object (with a ``compress`` and
+                             a ``flush`` method)
+
+    The writer is given to :py:meth:`pandas.DataFrame.to_csv`, so that the CSV
+    is compressed as it's being serialized (instead of being serialized as a
+    whole, then encoded, then compressed).
+
+    """
+    def __init__(self, f, compressor):
+        """Construction of the _CompressedWriter class."""
+        self._f = f
+        self._compressor = compressor
+
+    def writable(self):
+        """The writer is writable."""
+        return True
+
+    def write(self, data):
+        """Compresses and writes a chunk of data."""
+        self._f.write(self._compressor.compress(data))
+        return len(data)
+
+    def finish(self):
+        """Writes the remaining compressed data."""
+        self._f.write(self._compressor.flush())
+
+
+def generate_index(fn, cols=None, names=None, sep=" ", dtypes=None):
     """Build a index for the given file.
 
     Args:
@@ -52,6 +233,8 @@ def generate_index(fn, cols=None, names=None, sep=" "):
         cols (list): a list containing column to keep (as int)
         names (list): the name corresponding to the column to keep (as str)
         sep (str): the field separator
+        dtypes (dict): the data type of the columns to keep (by name), so that
+                       they aren't inferred (optional)
 
     Returns:
         pandas.DataFrame: the index
@@ -64,17 +247,31 @@ def generate_index(fn, cols=None, names=None, sep=" "):
     assert names is not None, "'names' was not set"
     assert len(cols) == len(names)
 
-    # Getting the open function
+    # Checking the file format
     bgzip, open_func = get_open_func(fn, return_fmt=True)
 
-    # Reading the required columns
-    data = pd.read_csv(fn, sep=sep, engine="c", usecols=cols, names=names,
-                       compression="gzip" if bgzip else None)
-
-    # Getting the seek information
-    f = open_func(fn, "rb")
-    data["seek"] = np.fromiter(_seek_generator(f), dtype=np.uint)[:-1]
-    f.close()
+    if bgzip and not HAS_BGZF_BLOCKS:
+        # Reading the required columns, then the virtual offsets (as told by
+        # BGZF)
+        data = pd.read_csv(fn, sep=sep, engine="c", usecols=cols,
+                           names=names, dtype=dtypes, low_memory=False,
+                           compression="gzip")
+        with open_func(fn, "rb") as f:
+            data["seek"] = np.fromiter(_seek_generator(f), dtype=np.uint64,
+                                       count=len(data))
+
+        # Saving the index to file
+        write_index(get_index_fn(fn), data)
+
+        return data
+
+    # Reading the required columns and the seek information in a single pass
+    # (the BGZF blocks are decompressed by the scanner)
+    with open(fn, "rb") as f:
+        scanner = _BgzfNewLineScanner(f) if bgzip else _NewLineScanner(f)
+        data = pd.read_csv(scanner, sep=sep, engine="c", usecols=cols,
+                           names=names, dtype=dtypes, low_memory=False)
+    data["seek"] = scanner.get_seek_positions(len(data))
 
     # Saving the index to file
     write_index(get_index_fn(fn), data)
@@ -94,28 +291,31 @@ def get_open_func(fn, return_fmt=False):
                format is bgzip, and the opening function.
 
     """
-    # The file might be compressed using bgzip
-    bgzip = None
-    with open(fn, "rb") as i_file:
-        bgzip = i_file.read(3) == b"\x1f\x8b\x08"
+    # The file might be compressed using bgzip (a plain file doesn't need any
+    # other validation, hence no file object is required)
+    fd = os.open(fn, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        bgzip = os.read(fd, 3) == b"\x1f\x8b\x08"
 
-    if bgzip and not HAS_BIOPYTHON:
-        raise GenipeError("needs BioPython to index a bgzip file")
+        if bgzip and not HAS_BIOPYTHON:
+            raise GenipeError("needs BioPython to index a bgzip file")
 
-    open_func = open
-    if bgzip:
-        open_func = BgzfReader
+        # Checking the first block is BGZF (using the same file descriptor)
+        if bgzip:
+            with os.fdopen(fd, "rb", closefd=False) as i_file:
+                i_file.seek(0)
+                try:
+                    if not BgzfReader(fileobj=i_file).seekable():
+                        raise ValueError
 
-    # Trying to read
-    try:
-        with open_func(fn, "r") as i_file:
-            if bgzip:
-                if not i_file.seekable():
-                    raise ValueError
-            pass
+                except ValueError:
+                    raise GenipeError("{}: use bgzip for compression..."
+                                      "".format(fn))
+
+    finally:
+        os.close(fd)
 
-    except ValueError:
-        raise GenipeError("{}: use bgzip for compression...".format(fn))
+    open_func = BgzfReader if bgzip else open
 
     if return_fmt:
         return bgzip, open_func
@@ -123,7 +323,7 @@ def get_open_func(fn, return_fmt=False):
     return open_func
 
 
-def get_index(fn, cols, names, sep):
+def get_index(fn, cols, names, sep, dtypes=None):
     """Restores the index for a given file.
 
     Args:
@@ -131,20 +331,34 @@ def get_index(fn, cols, names, sep):
         cols (list): a list containing column to keep (as int)
         names (list): the name corresponding to the column to keep (as str)
         sep (str): the field separator
+        dtypes (dict): the data type of the columns to keep (by name), used
+                       when the index is generated (optional)
 
     Returns:
         pandas.DataFrame: the index
 
-    If the index doesn't exist for the file, it is first created.
+    If the index doesn't exist for the file (or if it was written in a format
+    that requires a missing optional dependency), it is first created.
 
     """
-    if not has_index(fn):
+    # The name of the index (resolved only once)
+    index_fn = get_index_fn(fn)
+
+    if not os.path.isfile(index_fn):
         # The index doesn't exists, generate it
-        return generate_index(fn, cols, names, sep)
+        return generate_index(fn, cols, names, sep, dtypes)
 
     # Retrieving the index
     logging.info("Retrieving the index for '{}'".format(fn))
-    file_index = read_index(get_index_fn(fn))
+    try:
+        file_index = read_index(index_fn)
+
+    except _UnreadableIndexError:
+        # The index was written with an optional dependency that is missing
+        # here, so it's generated again (in a format that can be read)
+        logging.warning("{}: index can't be read (missing optional "
+                        "dependency): reindexing".format(fn))
+        return generate_index(fn, cols, names, sep, dtypes)
 
     # Checking the names are there
     if len(set(names) - (set(file_index.columns) - {'seek'})) != 0:
@@ -163,13 +377,35 @@ def write_index(fn, index):
         fn (str): the name of the file that will contain the index
         index (pandas.DataFrame): the index
 
+    The index is serialized as a (zstandard compressed) Arrow IPC stream if
+    pyarrow is installed, so that it's read back without parsing and with its
+    data types. Otherwise, it's serialized as CSV, compressed using zstandard
+    if it's installed (zlib otherwise).
+
     """
+    if HAS_PYARROW:
+        table = pa.Table.from_pandas(index, preserve_index=False)
+        options = pa.ipc.IpcWriteOptions(compression="zstd")
+        with open(fn, "wb") as o_file:
+            o_file.write(_CHECK_STRING_V3)
+            with pa.ipc.new_stream(o_file, table.schema,
+                                   options=options) as writer:
+                writer.write_table(table)
+        return
+
     with open(fn, "wb") as o_file:
-        o_file.write(_CHECK_STRING)
-        o_file.write(zlib.compress(bytes(
-            index.to_csv(None, index=False, encoding="utf-8"),
-            encoding="utf-8",
-        )))
+        if HAS_ZSTD:
+            o_file.write(_CHECK_STRING_V2)
+            compressor = zstd.ZstdCompressor(level=_ZSTD_LEVEL).compressobj()
+
+        else:
+            o_file.write(_CHECK_STRING)
+            compressor = zlib.compressobj()
+
+        # Streaming the CSV through the compressor
+        writer = _CompressedWriter(o_file, compressor)
+        index.to_csv(writer, index=False, encoding="utf-8")
+        writer.finish()
 
 
 def read_index(fn):
@@ -182,19 +418,47 @@ def read_index(fn):
         pandas.DataFrame: the index of the file
 
     Before reading the index, we check the first couple of bytes to see if it
-    is a valid index file.
+    is a valid index file (either an Arrow IPC stream, or CSV compressed using
+    zstandard or zlib).
 
     """
-    index = None
     with open(fn, "rb") as i_file:
-        if i_file.read(len(_CHECK_STRING)) != _CHECK_STRING:
+        check_string = i_file.read(len(_CHECK_STRING))
+
+        if check_string.startswith(_CHECK_STRING_V3):
+            if not HAS_PYARROW:
+                raise _UnreadableIndexError(
+                    "{}: needs pyarrow to read the index (delete it to "
+                    "reindex)".format(fn),
+                )
+
+            # Reading the stream from a memory map
+            with pa.memory_map(fn) as source:
+                source.seek(len(_CHECK_STRING_V3))
+                return pa.ipc.open_stream(source).read_pandas()
+
+        if check_string.startswith(_CHECK_STRING_V2):
+            if not HAS_ZSTD:
+                raise _UnreadableIndexError(
+                    "{}: needs zstandard to read the index (delete it to "
+                    "reindex)".format(fn),
+                )
+            decompress = zstd.ZstdDecompressor().decompressobj().decompress
+            start = len(_CHECK_STRING_V2)
+
+        elif check_string == _CHECK_STRING:
+            decompress = zlib.decompress
+            start = len(_CHECK_STRING)
+
+        else:
             raise GenipeError("{}: not a valid index file".format(fn))
 
-        index = pd.read_csv(io.StringIO(
-            zlib.decompress(i_file.read()).decode(encoding="utf-8"),
-        ))
+        # Decompressing directly from a memory map
+        with mmap.mmap(i_file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with memoryview(mm) as view:
+                payload = decompress(view[start:])
 
-    return index
+    return pd.read_csv(io.BytesIO(payload))
 
 
 def get_index_fn(fn):
@@ -76,6 +76,12 @@ def parse_args(parser):
         "--bgzip", action="store_true",
         help="Use bgzip to compress the impute2 files.",
     )
+    group.add_argument(
+        "--no-wal", action="store_false", dest="task_db_wal",
+        help="Don't use the write-ahead log for the task DB (required when "
+             "the output directory is on a network file system, such as NFS "
+             "or Lustre).",
+    )
 
     # The HPC options
     group = parser.add_argument_group("HPC Options")
@@ -105,7 +105,7 @@ def main():
             args.preamble = read_preamble(args.preamble)
 
         # Creating the database
-        db_name = db.create_task_db(args.out_dir)
+        db_name = db.create_task_db(args.out_dir, wal=args.task_db_wal)
 
         # Creating the output directories
         for chrom in args.required_chrom_names:
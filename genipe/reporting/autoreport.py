@@ -6,7 +6,9 @@
 
 import os
 import shutil
+import functools
 from datetime import date
+from itertools import islice
 
 from pkg_resources import resource_filename
 
@@ -23,6 +25,165 @@ __license__ = "Attribution-NonCommercial 4.0 International (CC BY-NC 4.0)"
 __all__ = ["generate_report", ]
 
 
+# The static files copied along with the report (bibliography, bibliography
+# style and Makefile)
+_STATIC_FILES = tuple(
+    resource_filename(__name__, os.path.join("templates", *path))
+    for path in (("biblio", "references.bib"), ("biblio", "references.bst"),
+                 ("utils", "Makefile"))
+)
+
+# The buffer size when writing the report
+_BUFFER_SIZE = 1 << 20
+
+# The templates used to generate the report
+_TEMPLATE_NAMES = (
+    "main_template.tex", "section_template.tex", "tabular_template.tex",
+    "float_template.tex", "iterate_template.tex", "graphics_template.tex",
+    "parts/methods.tex", "parts/methods_steps.tex",
+    "parts/cross_validation.tex", "parts/completion_rate.tex",
+    "parts/frequencies.tex", "parts/conclusions.tex",
+)
+
+# The separators (for the filtering rules enumeration)
+_SEP_SPACE = utils.sanitize_tex(" ")
+_SEP_COMMA = utils.sanitize_tex(", ")
+_SEP_OR = utils.sanitize_tex(" or ")
+
+# The header of the two kind of cross-validation tables (and their alignment)
+_HEADER_TABLE_1 = tuple(
+    utils.format_tex(utils.sanitize_tex(name), "textbf")
+    for name in ("Interval", "Nb Geno", "Concordance (%)")
+)
+_HEADER_TABLE_2 = tuple(
+    utils.format_tex(utils.sanitize_tex(name), "textbf")
+    for name in ("Interval", "Called (%)", "Concordance (%)")
+)
+_COL_ALIGN_CRR = ("c", "r", "r")
+
+# The "greater or equal" symbol (for the cross-validation intervals)
+_GEQ = r"\geq "
+
+# Sanitizing the labels which are the same for all reports
+_sanitize_tex = functools.lru_cache(maxsize=1024)(utils.sanitize_tex)
+
+# The output files (name and description) listed in the conclusions (the
+# "{prob}", "{rate}" and "{info}" parts are replaced by the thresholds)
+_OUTPUT_FILES = (
+    ("chr*.imputed.alleles", (
+        "description of the reference and alternative allele at each site.",
+    )),
+    ("chr*.imputed.completion_rates", (
+        "number of missing values and completion rate for all site (using a "
+        "probability threshold ", "{prob}", ").",
+    )),
+    ("chr*.imputed.good_sites", (
+        "list of sites which pass the information threshold (", "{info}",
+        ") and the completion rate threshold (", "{rate}",
+        ") using the probability threshold ", "{prob}", ".",
+    )),
+    ("chr*.imputed.impute2", (
+        "imputation results (merged from all segments).",
+    )),
+    ("chr*.imputed.impute2_info", (
+        "the IMPUTE2 marker-wise information file (merged from all "
+        "segments).",
+    )),
+    ("chr*.imputed.imputed_sites", (
+        "list of imputed sites (excluding sites that were previously "
+        "genotyped in the study cohort).",
+    )),
+    ("chr*.imputed.log", (
+        "log file of the merging procedure.",
+    )),
+    ("chr*.imputed.maf", (
+        "minor allele frequency (along with minor allele identification) for "
+        "all sites using the probability threshold ", "{prob}", ".",
+    )),
+    ("chr*.imputed.map", (
+        "a map file describing the genomic location of all sites.",
+    )),
+    ("chr*.imputed.sample", (
+        "the sample file generated by the phasing step.",
+    )),
+)
+
+# The header of the execution time tables
+_TIME_HEADER = tuple(
+    utils.format_tex(utils.sanitize_tex(name), "textbf")
+    for name in ("Chrom", "Time")
+)
+_IMPUTE2_TIME_HEADER = tuple(
+    utils.format_tex(utils.sanitize_tex(name), "textbf")
+    for name in ("Chrom", "Nb Seg.", "Mean T.", "Max T.")
+)
+
+# The execution time tables of the annex (run information key, task name,
+# label, header and first time column)
+_ANNEX_TABLES = (
+    ("plink_exclude_exec_time", "plink_exclude_chr*",
+     "plink_exclude_exec_time", _TIME_HEADER, 1),
+    ("shapeit_check_1_exec_time", "shapeit_check_chr*_1",
+     "shapeit_check_1_exec_time", _TIME_HEADER, 1),
+    ("plink_flip_exec_time", "plink_flip_chr*", "plink_flip_exec_time",
+     _TIME_HEADER, 1),
+    ("shapeit_check_2_exec_time", "shapeit_check_chr*_2",
+     "shapeit_check_2_exec_time", _TIME_HEADER, 1),
+    ("plink_final_exec_time", "plink_final_exclude_chr*",
+     "plink_final_exclude_exec_time", _TIME_HEADER, 1),
+    ("shapeit_phase_exec_time", "shapeit_phase_chr*",
+     "shapeit_phase_exec_time", _TIME_HEADER, 1),
+    ("impute2_exec_time", "impute2_chr*", "impute2_exec_time",
+     _IMPUTE2_TIME_HEADER, 2),
+    ("merge_impute2_exec_time", "merge_impute2_chr*",
+     "merge_impute2_exec_time", _TIME_HEADER, 1),
+    ("bgzip_exec_time", "bgzip_chr*", "bgzip_exec_time", _TIME_HEADER, 1),
+)
+
+# The introduction of the annex (with the plink missing rate execution time)
+_ANNEX_INTRO_TEMPLATE = (
+    "The following tables show the execution time required by all the "
+    "different tasks. All tasks are split by chromosomes. Execution times for "
+    "imputation for each chromosome are means of individual segment times. "
+    "Computing all genotyped markers' missing rate took {}."
+)
+
+# The run information required by each of the sections
+_REQUIRED_METHODS = frozenset([
+    "shapeit_version", "impute2_version", "plink_version",
+    "initial_nb_markers", "initial_nb_samples", "nb_duplicates",
+    "nb_ambiguous", "nb_flip", "nb_exclude", "nb_phasing_markers",
+    "nb_flip_reference", "nb_special_markers", "reference_checked",
+    "no_marker_left", "no_imputed_sites", "nb_samples_no_gender",
+])
+_REQUIRED_RESULTS = frozenset([
+    "cross_validation_final_nb_genotypes",
+    "cross_validation_nb_genotypes_chrom", "cross_validation_table_1",
+    "cross_validation_table_2", "cross_validation_table_1_chrom",
+    "cross_validation_table_2_chrom", "prob_threshold", "nb_imputed",
+    "average_comp_rate", "rate_threshold", "info_threshold", "nb_good_sites",
+    "average_comp_rate_cleaned", "mean_missing", "nb_samples",
+    "nb_genotyped", "nb_genotyped_not_complete", "pct_genotyped_not_complete",
+    "nb_geno_now_complete", "pct_geno_now_complete", "nb_site_now_complete",
+    "pct_good_sites", "nb_missing_geno", "nb_maf_nan", "nb_marker_with_maf",
+    "nb_maf_geq_01", "nb_maf_geq_05", "nb_maf_lt_05", "nb_maf_lt_01",
+    "nb_maf_geq_01_lt_05", "pct_maf_geq_01", "pct_maf_geq_05",
+    "pct_maf_lt_05", "pct_maf_lt_01", "pct_maf_geq_01_lt_05",
+    "frequency_barh",
+])
+_REQUIRED_CONCLUSIONS = frozenset([
+    "nb_good_sites", "prob_threshold", "rate_threshold", "info_threshold",
+    "nb_genotyped",
+])
+_REQUIRED_ANNEX = frozenset([
+    "plink_exclude_exec_time", "shapeit_check_1_exec_time",
+    "shapeit_check_2_exec_time", "plink_missing_exec_time",
+    "plink_flip_exec_time", "plink_final_exec_time",
+    "shapeit_phase_exec_time", "merge_impute2_exec_time",
+    "impute2_exec_time", "bgzip_exec_time",
+])
+
+
 def generate_report(out_dir, run_opts, run_info):
     """Generate the report.
 
@@ -32,18 +193,21 @@ def generate_report(out_dir, run_opts, run_info):
         run_info (dict): the run information
 
     """
-    # Configuring Jinja2
+    # Configuring Jinja2 and loading the templates (only once)
     jinja2_env = utils.config_jinja2()
+    templates = {
+        name: jinja2_env.get_template(name) for name in _TEMPLATE_NAMES
+    }
 
     # Gathering the report data
-    today = date.today()
+    month, day, year = _format_date(date.today())
     report_data = {
         "report_number":   utils.sanitize_tex(run_opts.report_number),
         "title":           utils.sanitize_tex(run_opts.report_title),
         "author":          utils.sanitize_tex(run_opts.report_author),
-        "month":           utils.sanitize_tex("{:%B}".format(today)),
-        "day":             utils.sanitize_tex("{:%d}".format(today)),
-        "year":            utils.sanitize_tex("{:%Y}".format(today)),
+        "month":           month,
+        "day":             day,
+        "year":            year,
         "package_name":    utils.sanitize_tex(__name__.split(".")[0]),
         "package_version": utils.sanitize_tex(__version__),
     }
@@ -52,58 +216,71 @@ def generate_report(out_dir, run_opts, run_info):
     figures = ["frequency_barh"]
     for figure in figures:
         assert figure in run_info, figure
-        if run_info[figure] != "":
-            shutil.copy(run_info[figure], out_dir)
-            run_info[figure] = os.path.basename(run_info[figure])
+        figure_fn = os.fspath(run_info[figure])
+        if figure_fn:
+            run_info[figure] = os.path.basename(figure_fn)
+            shutil.copyfile(figure_fn, os.path.join(out_dir, run_info[figure]))
 
     # Gathering the report content
-    report_content = ""
-    report_content += _generate_background(jinja2_env, run_opts, run_info)
-    report_content += _generate_methods(jinja2_env, run_opts, run_info)
-    report_content += _generate_results(jinja2_env, run_opts, run_info)
-    report_content += _generate_conclusions(jinja2_env, run_opts, run_info)
-    report_data["report_content"] = report_content
+    report_content = [
+        _generate_background(templates, run_opts, run_info),
+        _generate_methods(templates, run_opts, run_info),
+        _generate_results(templates, run_opts, run_info),
+        _generate_conclusions(templates, run_opts, run_info),
+    ]
+    report_data["report_content"] = "".join(report_content)
 
     # Gathering the annex content
-    annex_content = _generate_annex(jinja2_env, run_opts, run_info)
+    annex_content = _generate_annex(templates, run_opts, run_info)
     report_data["annex_content"] = annex_content
 
     # Getting the template
-    main_template = jinja2_env.get_template("main_template.tex")
+    main_template = templates["main_template.tex"]
 
     # Writing the report
     report_filename = os.path.join(out_dir, "report.tex")
     try:
-        with open(report_filename, "w") as o_file:
-            print(main_template.render(**report_data), file=o_file)
+        with open(report_filename, "w", buffering=_BUFFER_SIZE) as o_file:
+            main_template.stream(**report_data).dump(o_file)
+            o_file.write("\n")
 
     except FileNotFoundError:
         raise GenipeError("{}: cannot write file".format(report_filename))
 
-    # Copying the bibliography file
-    bib_file = resource_filename(
-        __name__, os.path.join("templates", "biblio", "references.bib"),
-    )
-    shutil.copy(bib_file, out_dir)
+    # Copying the bibliography file, the bibliography style and the Makefile
+    # (to help build the report)
+    for filename in _STATIC_FILES:
+        shutil.copyfile(
+            filename, os.path.join(out_dir, os.path.basename(filename)),
+        )
 
-    # Copying the bibliography style
-    bib_style = resource_filename(
-        __name__, os.path.join("templates", "biblio", "references.bst"),
-    )
-    shutil.copy(bib_style, out_dir)
 
-    # Copying the Makefile (to help build the report)
-    makefile = resource_filename(
-        __name__, os.path.join("templates", "utils", "Makefile"),
-    )
-    shutil.copy(makefile, out_dir)
+@functools.lru_cache(maxsize=1)
+def _format_date(today):
+    """Formats the date of the report.
+
+    Args:
+        today (datetime.date): the date of the report
+
+    Returns:
+        tuple: the sanitized month, day and year
+
+    Note
+    ----
+        The date is the key of the cache, so that reports generated on the
+        same day only format it once (and a new day is formatted again).
+
+    """
+    return (utils.sanitize_tex("{:%B}".format(today)),
+            utils.sanitize_tex("{:%d}".format(today)),
+            utils.sanitize_tex("{:%Y}".format(today)))
 
 
 def _generate_background(templates, run_options, run_information):
     """Generates the background section of the report.
 
     Args:
-        templates (jinja2.Environment): the jinja2 template environment
+        templates (dict): the jinja2 templates (by name)
         run_options (dict): the run options
         run_information (dict): the run information
 
@@ -123,7 +300,7 @@ def _generate_background(templates, run_options, run_information):
             )
 
     # Loading the template
-    section_template = templates.get_template("section_template.tex")
+    section_template = templates["section_template.tex"]
 
     # Returning the section
     return section_template.render(
@@ -138,7 +315,7 @@ def _generate_methods(templates, run_options, run_information):
     """Generate the method section of the report.
 
     Args:
-        templates (jinja2.Environment): the jinja2 template environment
+        templates (dict): the jinja2 templates (by name)
         run_options (dict): the run options
         run_information (dict): the run information
 
@@ -147,38 +324,32 @@ def _generate_methods(templates, run_options, run_information):
 
     """
     # Some assertions
-    required_variables = ["shapeit_version", "impute2_version",
-                          "plink_version", "initial_nb_markers",
-                          "initial_nb_samples", "nb_duplicates",
-                          "nb_ambiguous", "nb_flip", "nb_exclude",
-                          "nb_phasing_markers", "nb_flip_reference",
-                          "nb_special_markers", "reference_checked",
-                          "no_marker_left", "no_imputed_sites",
-                          "nb_samples_no_gender"]
-    for required_variable in required_variables:
-        assert required_variable in run_information, required_variable
+    assert _REQUIRED_METHODS.issubset(run_information), \
+        sorted(_REQUIRED_METHODS.difference(run_information))
 
     # Loading the templates
-    section_template = templates.get_template("section_template.tex")
-    itemize_template = templates.get_template("iterate_template.tex")
-    methods = templates.get_template("parts/methods.tex")
+    section_template = templates["section_template.tex"]
+    steps_template = templates["parts/methods_steps.tex"]
+    methods = templates["parts/methods.tex"]
 
     # Are there any filtering rules?
     filtering_rules = ""
     if run_options.filtering_rules is not None:
-        filtering_rules = utils.sanitize_tex(" (filtering out sites where")
-        for i, rule in enumerate(run_options.filtering_rules):
-            p = ", "
-            if i == 0:
-                p = " "
-            elif i == len(run_options.filtering_rules) - 1:
-                p = " or "
-            p = utils.sanitize_tex(p)
-            filtering_rules += p + utils.format_tex(
+        # The separator before each rule
+        nb_rules = len(run_options.filtering_rules)
+        separators = [_SEP_SPACE]
+        if nb_rules > 1:
+            separators += [_SEP_COMMA] * (nb_rules - 2) + [_SEP_OR]
+
+        filtering_rules = [utils.sanitize_tex(" (filtering out sites where")]
+        for p, rule in zip(separators, run_options.filtering_rules):
+            filtering_rules.append(p)
+            filtering_rules.append(utils.format_tex(
                 utils.sanitize_tex(rule),
                 "texttt",
-            )
-        filtering_rules += utils.sanitize_tex(")")
+            ))
+        filtering_rules.append(utils.sanitize_tex(")"))
+        filtering_rules = "".join(filtering_rules)
 
     # The input files
     data_files = [
@@ -186,80 +357,7 @@ def _generate_methods(templates, run_options, run_information):
     ]
 
     # The text for the different steps
-    steps = []
-
-    # Was there an initial reference check?
-    to_add_1 = ""
-    to_add_2 = ""
-    if run_information["reference_checked"]:
-        to_add_1 = utils.sanitize_tex(
-            "An initial strand check was also performed using the human "
-            "reference genome. "
-        )
-        to_add_2 = utils.format_tex(
-            utils.sanitize_tex(
-                " Also, {nb_flip} markers were flipped because of strand "
-                "issue.".format(
-                    nb_flip=run_information["nb_flip_reference"],
-                )
-            ),
-            "textbf",
-        )
-
-    # The ambiguous and duplicated markers that were removed
-    steps.append(utils.wrap_tex(utils.sanitize_tex(
-        "Ambiguous markers with alleles "
-    ) + utils.format_tex("A", "texttt") + "/" +
-        utils.format_tex("T", "texttt") + " and " +
-        utils.format_tex("C", "texttt") + "/" +
-        utils.format_tex("G", "texttt") +
-        utils.sanitize_tex(
-            ", duplicated markers (same position), and markers located on "
-            "the mitochondrial or the Y chromosomes were excluded from the "
-            "imputation. "
-    ) + to_add_1 + utils.format_tex(
-        utils.sanitize_tex(
-            "In total, {ambiguous} ambiguous, {duplicated} duplicated and "
-            "{special} Y/mitochondrial markers were excluded.".format(
-                ambiguous=run_information["nb_ambiguous"],
-                duplicated=run_information["nb_duplicates"],
-                special=run_information["nb_special_markers"],
-            )
-        ),
-        "textbf",
-    ) + to_add_2))
-
-    # The number of markers that were flipped
-    steps.append(utils.wrap_tex(utils.sanitize_tex(
-        "Markers' strand was checked using the SHAPEIT algorithm and "
-        "IMPUTE2's reference files. "
-    ) + utils.format_tex(
-        utils.sanitize_tex(
-            "In total, {nb_markers} markers had an incorrect strand and "
-            "were flipped using Plink.".format(
-                nb_markers=run_information["nb_flip"],
-            )
-        ),
-        "textbf",
-    )))
-
-    # The number of excluded markers because of strand problem
-    steps.append(utils.wrap_tex(utils.sanitize_tex(
-        "The strand of each marker was checked again using SHAPEIT against "
-        "IMPUTE2's reference files. "
-    ) + utils.format_tex(
-        utils.sanitize_tex(
-            "In total, {nb_markers} markers were found to still be on the "
-            "wrong strand, and were hence excluded from the final dataset "
-            "using Plink.".format(
-                nb_markers=run_information["nb_exclude"],
-            )
-        ),
-        "textbf",
-    )))
-
-    steps = itemize_template.render(iteration_type="enumerate",
-                                    iteration_list=steps)
+    steps = steps_template.render(**run_information)
 
     # Returning the section
     return section_template.render(
@@ -279,7 +377,7 @@ def _generate_results(templates, run_options, run_information):
     """Generates the results section of the report.
 
     Args:
-        templates (jinja2.Environment): the jinja2 template environment
+        templates (dict): the jinja2 templates (by name)
         run_options (dict): the run options
         run_information (dict): the run information
 
@@ -288,76 +386,42 @@ def _generate_results(templates, run_options, run_information):
 
     """
     # Some assertions
-    required_variables = ["cross_validation_final_nb_genotypes",
-                          "cross_validation_nb_genotypes_chrom",
-                          "cross_validation_table_1",
-                          "cross_validation_table_2",
-                          "cross_validation_table_1_chrom",
-                          "cross_validation_table_2_chrom", "prob_threshold",
-                          "nb_imputed", "average_comp_rate", "rate_threshold",
-                          "info_threshold", "nb_good_sites",
-                          "average_comp_rate_cleaned", "mean_missing",
-                          "nb_samples", "nb_genotyped",
-                          "nb_genotyped_not_complete",
-                          "pct_genotyped_not_complete", "nb_geno_now_complete",
-                          "pct_geno_now_complete", "nb_site_now_complete",
-                          "pct_good_sites", "nb_missing_geno", "nb_maf_nan",
-                          "nb_marker_with_maf", "nb_maf_geq_01",
-                          "nb_maf_geq_05", "nb_maf_lt_05", "nb_maf_lt_01",
-                          "nb_maf_geq_01_lt_05", "pct_maf_geq_01",
-                          "pct_maf_geq_05", "pct_maf_lt_05", "pct_maf_lt_01",
-                          "pct_maf_geq_01_lt_05", "frequency_barh"]
-
-    for required_variable in required_variables:
-        assert required_variable in run_information, required_variable
+    assert _REQUIRED_RESULTS.issubset(run_information), \
+        sorted(_REQUIRED_RESULTS.difference(run_information))
 
     # Loading the templates
-    section_template = templates.get_template("section_template.tex")
-    tabular_template = templates.get_template("tabular_template.tex")
-    graphics_template = templates.get_template("graphics_template.tex")
-    float_template = templates.get_template("float_template.tex")
-    cross_validation = templates.get_template("parts/cross_validation.tex")
-    completion_rate = templates.get_template("parts/completion_rate.tex")
-    frequencies = templates.get_template("parts/frequencies.tex")
-
-    # The header of the two kind of tables
-    header_table_1 = [
-        utils.format_tex(utils.sanitize_tex("Interval"), "textbf"),
-        utils.format_tex(utils.sanitize_tex("Nb Geno"), "textbf"),
-        utils.format_tex(utils.sanitize_tex("Concordance (%)"), "textbf"),
-    ]
-    header_table_2 = [
-        utils.format_tex(utils.sanitize_tex("Interval"), "textbf"),
-        utils.format_tex(utils.sanitize_tex("Called (%)"), "textbf"),
-        utils.format_tex(utils.sanitize_tex("Concordance (%)"), "textbf"),
-    ]
+    section_template = templates["section_template.tex"]
+    tabular_template = templates["tabular_template.tex"]
+    graphics_template = templates["graphics_template.tex"]
+    float_template = templates["float_template.tex"]
+    cross_validation = templates["parts/cross_validation.tex"]
+    completion_rate = templates["parts/completion_rate.tex"]
+    frequencies = templates["parts/frequencies.tex"]
 
     # Creating the tables
-    tables = ""
+    tables = []
 
     # Adding the table for each of the chromosomes
     for chrom in run_options.required_chrom:
         # Getting the table 1
-        table_1 = run_information["cross_validation_table_1_chrom"][chrom]
-        for i in range(len(table_1)):
-            table_1[i][0] = utils.tex_inline_math(table_1[i][0])
+        table_1 = _format_intervals(
+            run_information["cross_validation_table_1_chrom"][chrom],
+        )
         table_1 = utils.create_tabular(
             template=tabular_template,
-            header=header_table_1,
-            col_align=["c", "r", "r"],
+            header=_HEADER_TABLE_1,
+            col_align=_COL_ALIGN_CRR,
             data=table_1,
         )
 
         # Getting the table 2
-        table_2 = run_information["cross_validation_table_2_chrom"][chrom]
-        for i in range(len(table_2)):
-            table_2[i][0] = utils.tex_inline_math(
-                table_2[i][0].replace(">=", r"\geq "),
-            )
+        table_2 = _format_intervals(
+            run_information["cross_validation_table_2_chrom"][chrom],
+        )
         table_2 = utils.create_tabular(
             template=tabular_template,
-            header=header_table_2,
-            col_align=["c", "r", "r"],
+            header=_HEADER_TABLE_2,
+            col_align=_COL_ALIGN_CRR,
             data=table_2,
         )
 
@@ -366,7 +430,7 @@ def _generate_results(templates, run_options, run_information):
         nb_genotypes = nb_genotypes[chrom]
 
         # Adding the float
-        tables += utils.create_float(
+        tables.append(utils.create_float(
             template=float_template,
             float_type="table",
             caption=utils.wrap_tex(utils.sanitize_tex(
@@ -378,38 +442,38 @@ def _generate_results(templates, run_options, run_information):
             label="tab:cross_validation_chr_{}".format(chrom),
             placement="H",
             content=table_1 + r"\hfill" + table_2,
-        )
+        ))
 
-    # Adding the table for all the chromosomes (Table 1)
-    table_1 = run_information["cross_validation_table_1"]
-    for i in range(len(table_1)):
-        table_1[i][0] = utils.tex_inline_math(table_1[i][0])
-    table_1 = utils.create_tabular(
-        template=tabular_template,
-        header=header_table_1,
-        col_align=["c", "r", "r"],
-        data=table_1,
-    )
+    # Adding the tables for all the chromosomes (only if more than one)
+    if len(run_options.required_chrom) > 1:
+        # Table 1
+        table_1 = _format_intervals(
+            run_information["cross_validation_table_1"],
+        )
+        table_1 = utils.create_tabular(
+            template=tabular_template,
+            header=_HEADER_TABLE_1,
+            col_align=_COL_ALIGN_CRR,
+            data=table_1,
+        )
 
-    # Adding the table for all the chromosomes (Table 2)
-    table_2 = run_information["cross_validation_table_2"]
-    for i in range(len(table_2)):
-        table_2[i][0] = utils.tex_inline_math(
-            table_2[i][0].replace(">=", r"\geq "),
+        # Table 2
+        table_2 = _format_intervals(
+            run_information["cross_validation_table_2"],
+        )
+        table_2 = utils.create_tabular(
+            template=tabular_template,
+            header=_HEADER_TABLE_2,
+            col_align=_COL_ALIGN_CRR,
+            data=table_2,
         )
-    table_2 = utils.create_tabular(
-        template=tabular_template,
-        header=header_table_2,
-        col_align=["c", "r", "r"],
-        data=table_2,
-    )
 
-    # The number of genotypes
-    nb_genotypes = run_information["cross_validation_final_nb_genotypes"]
+        # The number of genotypes
+        nb_genotypes = run_information["cross_validation_final_nb_genotypes"]
 
-    # Adding the float
-    if len(run_options.required_chrom) > 1:
-        tables += "\n\n" + utils.create_float(
+        # Adding the float
+        tables.append("\n\n")
+        tables.append(utils.create_float(
             template=float_template,
             float_type="table",
             caption=utils.wrap_tex(utils.sanitize_tex(
@@ -421,7 +485,7 @@ def _generate_results(templates, run_options, run_information):
             label="tab:cross_validation",
             placement="H",
             content=table_1 + r"\hfill" + table_2,
-        )
+        ))
 
     # Creating the cross-validation subsection
     cross_validation_content = section_template.render(
@@ -431,7 +495,7 @@ def _generate_results(templates, run_options, run_information):
             single_chromosome=len(run_options.required_chrom) == 1,
             first_chrom=run_options.required_chrom[0],
             last_chrom=run_options.required_chrom[-1],
-            tables=tables,
+            tables="".join(tables),
         ),
         section_label="subsec:cross_validation",
     )
@@ -488,7 +552,7 @@ def _generate_conclusions(templates, run_options, run_information):
     """Generates the background section of the report.
 
     Args:
-        templates (jinja2.Environment): the jinja2 template environment
+        templates (dict): the jinja2 templates (by name)
         run_options (dict): the run options
         run_information (dict): the run information
 
@@ -497,15 +561,24 @@ def _generate_conclusions(templates, run_options, run_information):
 
     """
     # Some assertions
-    required_variables = ["nb_good_sites", "prob_threshold", "rate_threshold",
-                          "info_threshold", "nb_genotyped"]
-    for required_variable in required_variables:
-        assert required_variable in run_information
+    assert _REQUIRED_CONCLUSIONS.issubset(run_information), \
+        sorted(_REQUIRED_CONCLUSIONS.difference(run_information))
 
     # Loading the template
-    section_template = templates.get_template("section_template.tex")
-    conclusions = templates.get_template("parts/conclusions.tex")
-    itemize_template = templates.get_template("iterate_template.tex")
+    section_template = templates["section_template.tex"]
+    conclusions = templates["parts/conclusions.tex"]
+    itemize_template = templates["iterate_template.tex"]
+
+    # The thresholds (each formatted only once)
+    geq_prob = utils.tex_inline_math(
+        r"\geq {}\%".format(run_information["prob_threshold"])
+    )
+    geq_rate = utils.tex_inline_math(
+        r"\geq {}\%".format(run_information["rate_threshold"])
+    )
+    geq_info = utils.tex_inline_math(
+        r"\geq {}".format(run_information["info_threshold"])
+    )
 
     # Adding the required information (output directories)
     run_information["output_dir"] = utils.sanitize_tex(run_options.out_dir)
@@ -517,102 +590,10 @@ def _generate_conclusions(templates, run_options, run_information):
     )
 
     # Output files
+    thresholds = {"{prob}": geq_prob, "{rate}": geq_rate, "{info}": geq_info}
     output_files = [
-        utils.wrap_tex(
-            utils.format_tex(utils.sanitize_tex("chr*.imputed.alleles"),
-                             "texttt") +
-            utils.sanitize_tex(": description of the reference and "
-                               "alternative allele at each site.")
-        ),
-        utils.wrap_tex(
-            utils.format_tex(
-                utils.sanitize_tex("chr*.imputed.completion_rates"),
-                "texttt",
-            ) +
-            utils.sanitize_tex(": number of missing values and completion "
-                               "rate for all site (using a probability "
-                               "threshold ") +
-            utils.tex_inline_math(
-                r"\geq {}\%".format(run_information["prob_threshold"])
-            ) + ")."
-        ),
-        utils.wrap_tex(
-            utils.format_tex(
-                utils.sanitize_tex("chr*.imputed.good_sites"),
-                "texttt",
-            ) +
-            utils.sanitize_tex(": list of sites which pass the information "
-                               "threshold (") +
-            utils.tex_inline_math(
-                r"\geq {}".format(run_information["info_threshold"])
-            ) + utils.sanitize_tex(") and the completion rate threshold (") +
-            utils.tex_inline_math(
-                r"\geq {}\%".format(run_information["rate_threshold"])
-            ) + utils.sanitize_tex(") using the probability threshold ") +
-            utils.tex_inline_math(
-                r"\geq {}\%".format(run_information["prob_threshold"])
-            ) + "."
-        ),
-        utils.wrap_tex(
-            utils.format_tex(
-                utils.sanitize_tex("chr*.imputed.impute2"),
-                "texttt",
-            ) +
-            utils.sanitize_tex(": imputation results (merged from all "
-                               "segments).")
-        ),
-        utils.wrap_tex(
-            utils.format_tex(
-                utils.sanitize_tex("chr*.imputed.impute2_info"),
-                "texttt",
-            ) +
-            utils.sanitize_tex(": the IMPUTE2 marker-wise information file "
-                               "(merged from all segments).")
-        ),
-        utils.wrap_tex(
-            utils.format_tex(
-                utils.sanitize_tex("chr*.imputed.imputed_sites"),
-                "texttt",
-            ) +
-            utils.sanitize_tex(": list of imputed sites (excluding sites that "
-                               "were previously genotyped in the study "
-                               "cohort).")
-        ),
-        utils.wrap_tex(
-            utils.format_tex(
-                utils.sanitize_tex("chr*.imputed.log"),
-                "texttt",
-            ) +
-            utils.sanitize_tex(": log file of the merging procedure.")
-        ),
-        utils.wrap_tex(
-            utils.format_tex(
-                utils.sanitize_tex("chr*.imputed.maf"),
-                "texttt",
-            ) +
-            utils.sanitize_tex(": minor allele frequency (along with minor "
-                               "allele identification) for all sites using "
-                               "the probability threshold ") +
-            utils.tex_inline_math(
-                r"\geq {}\%".format(run_information["prob_threshold"])
-            ) + "."
-        ),
-        utils.wrap_tex(
-            utils.format_tex(
-                utils.sanitize_tex("chr*.imputed.map"),
-                "texttt",
-            ) +
-            utils.sanitize_tex(": a map file describing the genomic location "
-                               "of all sites.")
-        ),
-        utils.wrap_tex(
-            utils.format_tex(
-                utils.sanitize_tex("chr*.imputed.sample"),
-                "texttt",
-            ) +
-            utils.sanitize_tex(": the sample file generated by the phasing "
-                               "step.")
-        ),
+        _format_output_file(name, description, thresholds)
+        for name, description in _OUTPUT_FILES
     ]
 
     # Formating the enumeration of files
@@ -634,7 +615,7 @@ def _generate_annex(templates, run_options, run_information):
     """Generates the annex section of the report (execution times).
 
     Args:
-        templates (jinja2.Environment): the jinja2 template environment
+        templates (dict): the jinja2 templates (by name)
         run_options (dict): the run options
         run_information (dict): the run information
 
@@ -643,135 +624,50 @@ def _generate_annex(templates, run_options, run_information):
 
     """
     # Some assertions
-    required_variables = ["plink_exclude_exec_time",
-                          "shapeit_check_1_exec_time",
-                          "shapeit_check_2_exec_time",
-                          "plink_missing_exec_time", "plink_flip_exec_time",
-                          "plink_final_exec_time", "shapeit_phase_exec_time",
-                          "merge_impute2_exec_time", "impute2_exec_time",
-                          "bgzip_exec_time"]
-    for required_variable in required_variables:
-        assert required_variable in run_information, required_variable
+    assert _REQUIRED_ANNEX.issubset(run_information), \
+        sorted(_REQUIRED_ANNEX.difference(run_information))
 
     # Loading the templates
-    tabular_template = templates.get_template("tabular_template.tex")
-    float_template = templates.get_template("float_template.tex")
+    tabular_template = templates["tabular_template.tex"]
+    float_template = templates["float_template.tex"]
 
     # This section content
-    content = ("The following tables show the execution time required by all "
-               "the different tasks. All tasks are split by chromosomes. "
-               "Execution times for imputation for each chromosome are means "
-               "of individual segment times. Computing all genotyped markers' "
-               "missing rate took {}.")
-    content = utils.wrap_tex(utils.sanitize_tex(content.format(
-        utils.format_time(
-            run_information["plink_missing_exec_time"],
-            written_time=True,
-        ),
-    )))
-
-    # The header of the tables
-    table_header = [
-        utils.format_tex(utils.sanitize_tex("Chrom"), "textbf"),
-        utils.format_tex(utils.sanitize_tex("Time"), "textbf"),
-    ]
-
-    # Getting the first table (plink_exclude_chr*)
-    content += "\n\n" + _generate_time_float(
-        table=run_information["plink_exclude_exec_time"],
-        header=table_header,
-        task_name="plink_exclude_chr*",
-        label="plink_exclude_exec_time",
-        tabular_t=tabular_template,
-        float_t=float_template,
-    )
+    content = [_annex_intro(run_information["plink_missing_exec_time"]),
+               "\n\n"]
 
-    # Getting the second table (shapeit_check_chr*_1)
-    content += _generate_time_float(
-        table=run_information["shapeit_check_1_exec_time"],
-        header=table_header,
-        task_name="shapeit_check_chr*_1",
-        label="shapeit_check_1_exec_time",
-        tabular_t=tabular_template,
-        float_t=float_template,
-    )
-
-    # Getting the third table (plink_flip_chr*)
-    content += _generate_time_float(
-        table=run_information["plink_flip_exec_time"],
-        header=table_header,
-        task_name="plink_flip_chr*",
-        label="plink_flip_exec_time",
-        tabular_t=tabular_template,
-        float_t=float_template,
-    )
-
-    # Getting the fourth table (shapeit_check_chr*_2)
-    content += _generate_time_float(
-        table=run_information["shapeit_check_2_exec_time"],
-        header=table_header,
-        task_name="shapeit_check_chr*_2",
-        label="shapeit_check_2_exec_time",
-        tabular_t=tabular_template,
-        float_t=float_template,
+    # Adding the tables (only if there are tasks, e.g. bgzip is optional)
+    content.extend(
+        _generate_time_float(
+            table=run_information[key],
+            header=header,
+            task_name=task_name,
+            label=label,
+            tabular_t=tabular_template,
+            float_t=float_template,
+            first_time_col=first_time_col,
+        )
+        for key, task_name, label, header, first_time_col in _ANNEX_TABLES
+        if run_information[key]
     )
 
-    # Getting the fifth table (plink_final_exclude_chr*)
-    content += _generate_time_float(
-        table=run_information["plink_final_exec_time"],
-        header=table_header,
-        task_name="plink_final_exclude_chr*",
-        label="plink_final_exclude_exec_time",
-        tabular_t=tabular_template,
-        float_t=float_template,
-    )
+    return "".join(content)
 
-    # Getting the sixth table (shapeit_phase_chr*)
-    content += _generate_time_float(
-        table=run_information["shapeit_phase_exec_time"],
-        header=table_header,
-        task_name="shapeit_phase_chr*",
-        label="shapeit_phase_exec_time",
-        tabular_t=tabular_template,
-        float_t=float_template,
-    )
 
-    # Getting the seventh table (impute2_chr*)
-    content += _generate_time_float(
-        table=run_information["impute2_exec_time"],
-        header=[utils.format_tex(utils.sanitize_tex("Chrom"), "textbf"),
-                utils.format_tex(utils.sanitize_tex("Nb Seg."), "textbf"),
-                utils.format_tex(utils.sanitize_tex("Mean T."), "textbf"),
-                utils.format_tex(utils.sanitize_tex("Max T."), "textbf")],
-        task_name="impute2_chr*",
-        label="impute2_exec_time",
-        tabular_t=tabular_template,
-        float_t=float_template,
-        first_time_col=2,
-    )
+@functools.lru_cache(maxsize=128)
+def _annex_intro(plink_missing_time):
+    """Generates the introduction of the annex section.
 
-    # Getting the eight table (merge_impute2_chr*)
-    content += _generate_time_float(
-        table=run_information["merge_impute2_exec_time"],
-        header=table_header,
-        task_name="merge_impute2_chr*",
-        label="merge_impute2_exec_time",
-        tabular_t=tabular_template,
-        float_t=float_template,
-    )
+    Args:
+        plink_missing_time (int): the execution time of the plink missing rate
+                                  task (in seconds)
 
-    # The last table (bgzip_chr*) only if present
-    if run_information["bgzip_exec_time"]:
-        content += _generate_time_float(
-            table=run_information["bgzip_exec_time"],
-            header=table_header,
-            task_name="bgzip_chr*",
-            label="bgzip_exec_time",
-            tabular_t=tabular_template,
-            float_t=float_template,
-        )
+    Returns:
+        str: the introduction of the annex section
 
-    return content
+    """
+    return utils.wrap_tex(utils.sanitize_tex(_ANNEX_INTRO_TEMPLATE.format(
+        utils.format_time(plink_missing_time, written_time=True),
+    )))
 
 
 def _generate_time_float(task_name, label, table, header, tabular_t, float_t,
@@ -802,7 +698,7 @@ def _generate_time_float(task_name, label, table, header, tabular_t, float_t,
         template=tabular_t,
         header=header,
         col_align=["r"] * len(header),
-        data=_format_time_columns(table[:sep], first_time_col),
+        data=_format_time_columns(table, first_time_col, stop=sep),
     )
 
     # Adding the second table
@@ -813,13 +709,13 @@ def _generate_time_float(task_name, label, table, header, tabular_t, float_t,
             template=tabular_t,
             header=header,
             col_align=["r"] * len(header),
-            data=_format_time_columns(table[sep:], first_time_col),
+            data=_format_time_columns(table, first_time_col, start=sep),
         )
 
     # The caption
-    caption = utils.sanitize_tex("Execution time for the '")
-    caption += utils.format_tex(utils.sanitize_tex(task_name), "texttt")
-    caption += utils.sanitize_tex("' tasks.")
+    caption = _sanitize_tex("Execution time for the '")
+    caption += utils.format_tex(_sanitize_tex(task_name), "texttt")
+    caption += _sanitize_tex("' tasks.")
 
     # Returning the float
     return utils.create_float(
@@ -832,18 +728,74 @@ def _generate_time_float(task_name, label, table, header, tabular_t, float_t,
     )
 
 
-def _format_time_columns(table, first_col):
+def _format_time_columns(table, first_col, start=0, stop=None):
     """Colorize the time in the table (columns 2 and up).
 
     Args:
         table (list): the data for the tabular
         first_col (int): the first column containing time
+        start (int): the first row to format
+        stop (int): the row at which to stop (``None`` for the end)
+
+    Returns:
+        list: a copy of the rows (from start to stop), but with time column
+              colorized
+
+    """
+    return [
+        row[:first_col] + [utils.colorize_time(t) for t in row[first_col:]]
+        for row in islice(table, start, stop)
+    ]
+
+
+def _format_output_file(name, description, thresholds):
+    """Formats an output file and its description (for the conclusions).
+
+    Args:
+        name (str): the name of the output file
+        description (tuple): the parts of the description of the file
+        thresholds (dict): the formatted thresholds (by placeholder)
+
+    Returns:
+        str: the formatted output file and its description
+
+    """
+    return utils.wrap_tex(
+        utils.format_tex(_sanitize_tex(name), "texttt") + _sanitize_tex(": ") +
+        "".join(
+            thresholds[part] if part in thresholds else _sanitize_tex(part)
+            for part in description
+        )
+    )
+
+
+def _format_intervals(table):
+    """Formats the intervals of a cross-validation table (first column).
+
+    Args:
+        table (list): the data for the tabular
+
+    Returns:
+        list: a copy of the data, but with the intervals formatted
+
+    """
+    return [[_format_interval(row[0])] + row[1:] for row in table]
+
+
+@functools.lru_cache(maxsize=256)
+def _format_interval(interval):
+    """Formats a cross-validation interval (*e.g.* ``[>=0.1]``).
+
+    Args:
+        interval (str): the interval to format
 
     Returns:
-        list: the same data, but with time column colorized
+        str: the interval as an inline mathematical formula
+
+    Note
+    ----
+        The same intervals are used for all the chromosomes, hence the results
+        are cached.
 
     """
-    for i in range(len(table)):
-        for j in range(first_col, len(table[i])):
-            table[i][j] = utils.colorize_time(table[i][j])
-    return table
+    return utils.tex_inline_math(interval.replace(">=", _GEQ))
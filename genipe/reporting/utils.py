@@ -6,6 +6,7 @@
 
 import re
 from textwrap import wrap
+from functools import partial
 
 import jinja2
 
@@ -36,8 +37,12 @@ def config_jinja2():
         is done using ``\BLOCK{}`` and variables using ``\VAR{}`` in the Jinja2
         template.
 
+        The ``sanitize`` (:py:func:`sanitize_tex`), ``wrap``
+        (:py:func:`wrap_tex`) and TeX format (*e.g.* ``textbf``, see
+        :py:func:`format_tex`) filters are also available in the templates.
+
     """
-    return jinja2.Environment(
+    env = jinja2.Environment(
         block_start_string='\BLOCK{',
         block_end_string='}',
         variable_start_string='\VAR{',
@@ -51,6 +56,14 @@ def config_jinja2():
         loader=jinja2.PackageLoader(__name__, "templates"),
     )
 
+    # The filters (to sanitize and format text directly in the templates)
+    env.filters["sanitize"] = sanitize_tex
+    env.filters["wrap"] = wrap_tex
+    for tex_format in _valid_tex_formats:
+        env.filters[tex_format] = partial(format_tex, tex_format=tex_format)
+
+    return env
+
 
 def sanitize_tex(original_text):
     """Sanitize TeX text.
@@ -8,7 +8,9 @@ import time
 import logging
 import sqlite3
 import unittest
+import threading
 from datetime import datetime
+from unittest.mock import patch
 from tempfile import TemporaryDirectory
 
 from ..db import utils as db_utils
@@ -44,6 +46,9 @@ class TestDB(unittest.TestCase):
 
     def tearDown(self):
         """Finishes the test."""
+        # Closing the cached connection
+        db_utils.close_task_db(self.db_name)
+
         # Deleting the output directory
         self.output_dir.cleanup()
 
@@ -91,6 +96,44 @@ class TestDB(unittest.TestCase):
         if len(col_diff) != 0:  # pragma: no cover
             self.fail("not all DB columns are present")
 
+        # The completed column should be indexed
+        c.execute("SELECT name, tbl_name FROM sqlite_master "
+                  "WHERE type='index' AND sql IS NOT NULL")
+        self.assertEqual([("idx_task_completed", "genipe_task")],
+                         c.fetchall())
+
+        # The DB should use the write-ahead log
+        c.execute("PRAGMA journal_mode")
+        self.assertEqual("wal", c.fetchone()[0])
+
+        conn.close()
+
+    def test_create_task_db_no_wal(self):
+        """Tests the 'create_task_db' function (without WAL)."""
+        # The DB was created using WAL, it should be reverted
+        db_utils.close_task_db(self.db_name)
+        self.assertEqual(
+            self.db_name,
+            db_utils.create_task_db(self.output_dir.name, wal=False),
+        )
+
+        conn, c = _create_db_connection(self.db_name)
+        c.execute("PRAGMA journal_mode")
+        self.assertEqual("delete", c.fetchone()[0])
+
+        # The fewer syncs are only for WAL (FULL is 2)
+        c.execute("PRAGMA synchronous")
+        self.assertEqual(2, c.fetchone()[0])
+
+        # The tasks should still be there
+        c.execute("SELECT name FROM genipe_task")
+        self.assertEqual(self.task_names, [r[0] for r in c.fetchall()])
+        conn.close()
+
+        db_utils.mark_task_completed(self.task_names[0], self.db_name)
+        self.assertTrue(db_utils.check_task_completion(self.task_names[0],
+                                                       self.db_name))
+
     def test_create_db_connection(self):
         """Tests the '_create_db_connection' function."""
         # Creating the connection
@@ -100,9 +143,96 @@ class TestDB(unittest.TestCase):
         c.execute("SELECT name FROM sqlite_master WHERE type='table'")
         self.assertEqual("genipe_task", c.fetchone()[0])
 
+        # The timestamps should be converted
+        c.execute("SELECT launch FROM genipe_task")
+        self.assertIsInstance(c.fetchone()[0], datetime)
+
         # Closing the connection
         conn.close()
 
+        # The values shouldn't be converted
+        conn, c = _create_db_connection(self.db_name, typed=False)
+        c.execute("SELECT launch FROM genipe_task")
+        self.assertIsInstance(c.fetchone()[0], str)
+        conn.close()
+
+    def test_get_db_connection(self):
+        """Tests the '_get_db_connection' function."""
+        # The connection should be cached
+        conn = db_utils._get_db_connection(self.db_name)
+        self.assertIs(conn, db_utils._get_db_connection(self.db_name))
+
+        # Checking that the table 'genipe_task' exists
+        c = conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
+        self.assertEqual("genipe_task", c.fetchone()[0])
+
+        # Another thread should get another connection
+        other_conn = []
+        thread = threading.Thread(
+            target=lambda: other_conn.append(
+                db_utils._get_db_connection(self.db_name),
+            ),
+        )
+        thread.start()
+        thread.join()
+        self.assertIsNot(conn, other_conn[0])
+
+    def test_close_task_db(self):
+        """Tests the 'close_task_db' function."""
+        conn = db_utils._get_db_connection(self.db_name)
+        db_utils.close_task_db(self.db_name)
+
+        # The connection should be closed
+        with self.assertRaises(sqlite3.ProgrammingError):
+            conn.execute("SELECT name FROM genipe_task")
+
+        # A new connection should be created, and closing twice is fine
+        self.assertIsNot(conn, db_utils._get_db_connection(self.db_name))
+        db_utils.close_task_db(self.db_name)
+        db_utils.close_task_db(self.db_name)
+
+    def test_task_db_transaction(self):
+        """Tests the 'task_db_transaction' function."""
+        # Another connection, to check what was committed
+        conn, c = _create_db_connection(self.db_name)
+
+        with db_utils.task_db_transaction(self.db_name):
+            db_utils.create_task_entry("dummy_task_5", self.db_name)
+            with db_utils.task_db_transaction(self.db_name):
+                db_utils.mark_task_completed("dummy_task_5", self.db_name)
+
+            # Nothing should be committed yet (not even by the nested one)
+            c.execute("SELECT name FROM genipe_task WHERE name=?",
+                      ("dummy_task_5", ))
+            self.assertTrue(c.fetchone() is None)
+
+        # Everything should be committed
+        self.assertTrue(db_utils.check_task_completion("dummy_task_5",
+                                                       self.db_name))
+        c.execute("SELECT completed FROM genipe_task WHERE name=?",
+                  ("dummy_task_5", ))
+        self.assertEqual(1, c.fetchone()[0])
+
+        # Everything should be rolled back on error
+        with self.assertRaises(ValueError):
+            with db_utils.task_db_transaction(self.db_name):
+                db_utils.create_task_entry("dummy_task_6", self.db_name)
+                db_utils.mark_task_incomplete("dummy_task_5", self.db_name)
+                raise ValueError()
+        c.execute("SELECT name FROM genipe_task WHERE name=?",
+                  ("dummy_task_6", ))
+        self.assertTrue(c.fetchone() is None)
+        self.assertTrue(db_utils.check_task_completion("dummy_task_5",
+                                                       self.db_name))
+
+        # The helpers should commit by themselves again
+        db_utils.create_task_entry("dummy_task_6", self.db_name)
+        c.execute("SELECT name FROM genipe_task WHERE name=?",
+                  ("dummy_task_6", ))
+        self.assertEqual("dummy_task_6", c.fetchone()[0])
+
+        conn.close()
+
     def test_check_task_completion(self):
         """Tests the 'check_task_completion' function."""
         # Marking the first and fourth tasks as completed
@@ -219,6 +349,31 @@ class TestDB(unittest.TestCase):
         # Closing the connection
         conn.close()
 
+    @patch("genipe.db.utils._HAS_UPSERT", False)
+    def test_create_task_entry_no_upsert(self):
+        """Tests the 'create_task_entry' function (without UPSERT)."""
+        # Creating a new task and relaunching an existing one
+        db_utils.create_task_entry("dummy_task_5", self.db_name)
+        db_utils.mark_task_completed(self.task_names[0], self.db_name)
+        db_utils.create_task_entry(self.task_names[0], self.db_name)
+
+        conn, c = _create_db_connection(self.db_name)
+        c.execute("SELECT name, launch, start, completed FROM genipe_task")
+        results = {r[0]: r[1:] for r in c.fetchall()}
+        conn.close()
+
+        # There should be a new task
+        self.assertEqual(set(self.task_names) | {"dummy_task_5"},
+                         set(results.keys()))
+        o_launch, o_start, o_completed = results["dummy_task_5"]
+        self.assertEqual(o_launch, o_start)
+        self.assertTrue(o_completed is None)
+
+        # The relaunched task shouldn't be completed anymore
+        o_launch, o_start, o_completed = results[self.task_names[0]]
+        self.assertEqual(o_launch, o_start)
+        self.assertEqual(0, o_completed)
+
     def test_mark_task_completed(self):
         """Tests the 'mark_task_completed' function."""
         # The task that will be modified
@@ -423,6 +578,38 @@ class TestDB(unittest.TestCase):
 
         conn.close()
 
+    def test_mark_drmaa_tasks_completed(self):
+        """Tests the 'mark_drmaa_tasks_completed' function."""
+        # The tasks that will be modified (with their times)
+        now = datetime.now().timestamp()
+        modified_tasks = [
+            (task_name, now - 10 * (i + 1), now - 5 * (i + 1), now)
+            for i, task_name in enumerate(self.task_names[:2])
+        ]
+        db_utils.mark_drmaa_tasks_completed(modified_tasks, self.db_name)
+
+        # Creating the connection
+        conn, c = _create_db_connection(self.db_name)
+
+        # Checking the times for the modified tasks
+        c.execute(
+            "SELECT name, launch, start, end, completed FROM genipe_task"
+        )
+        results = {r[0]: r[1:] for r in c.fetchall()}
+        for task_name, launch_time, start_time, end_time in modified_tasks:
+            o_launch, o_start, o_end, o_completed = results[task_name]
+            self.assertAlmostEqual(launch_time, o_launch.timestamp(), 3)
+            self.assertAlmostEqual(start_time, o_start.timestamp(), 3)
+            self.assertAlmostEqual(end_time, o_end.timestamp(), 3)
+            self.assertEqual(1, o_completed)
+
+        # The other tasks should not be completed
+        for task_name in self.task_names[2:]:
+            self.assertTrue(results[task_name][2] is None)
+            self.assertTrue(results[task_name][3] is None)
+
+        conn.close()
+
     def test_get_task_runtime(self):
         """Tests the 'task_runtime' function."""
         # Those two tasks will be modified
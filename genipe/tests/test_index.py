@@ -0,0 +1,346 @@
+
+# This file is part of genipe.
+#
+# GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+
+
+import io
+import os
+import gzip
+import unittest
+from unittest.mock import patch
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import pandas as pd
+
+from ..formats import index
+from ..error import GenipeError
+
+
+__author__ = "Louis-Philippe Lemieux Perreault"
+__copyright__ = "Copyright 2014, Beaulieu-Saucier Pharmacogenomics Centre"
+__license__ = "Attribution-NonCommercial 4.0 International (CC BY-NC 4.0)"
+
+
+__all__ = ["TestIndex"]
+
+
+class TestIndex(unittest.TestCase):
+
+    def setUp(self):
+        """Setup the tests."""
+        # Creating the temporary directory
+        self.output_dir = TemporaryDirectory(prefix="genipe_test_")
+
+        # The content of the file to index
+        self.lines = [
+            "{chrom} marker_{i} {pos} A G {probs}\n".format(
+                chrom=(i // 500) + 1, i=i, pos=(i + 1) * 100,
+                probs=" ".join(["1 0 0"] * (i % 7 + 1)),
+            )
+            for i in range(2000)
+        ]
+
+    def tearDown(self):
+        """Finishes the test."""
+        # Deleting the output directory
+        self.output_dir.cleanup()
+
+    def _check_index(self, fn, file_index):
+        """Checks an index against the indexed file."""
+        # Checking the columns
+        self.assertEqual(["chrom", "name", "pos", "seek"],
+                         list(file_index.columns))
+        self.assertEqual(len(self.lines), len(file_index))
+        self.assertEqual([int(line.split(" ")[2]) for line in self.lines],
+                         list(file_index.pos))
+
+        # Checking the seek positions
+        with index.get_open_func(fn)(fn, "r") as i_file:
+            for line, seek in zip(self.lines, file_index.seek.values):
+                i_file.seek(int(seek))
+                self.assertEqual(line, i_file.readline())
+
+    def test_new_line_scanner(self):
+        """Tests the '_NewLineScanner' class."""
+        content = "".join(self.lines).encode()
+
+        # Reading by small chunks (so that lines overlap chunks)
+        scanner = index._NewLineScanner(io.BytesIO(content))
+        chunks = []
+        chunk = scanner.read(1000)
+        while chunk:
+            chunks.append(chunk)
+            chunk = scanner.read(1000)
+        self.assertEqual(content, b"".join(chunks))
+
+        # Checking the seek positions
+        expected = np.cumsum([0] + [len(line) for line in self.lines[:-1]])
+        observed = scanner.get_seek_positions(len(self.lines))
+        self.assertEqual(np.uint64, observed.dtype)
+        self.assertEqual(expected.tolist(), observed.tolist())
+
+        # The number of lines should match
+        with self.assertRaises(AssertionError) as cm:
+            scanner.get_seek_positions(len(self.lines) - 1)
+        self.assertEqual("invalid number of lines", str(cm.exception))
+
+    def test_generate_index(self):
+        """Tests the 'generate_index' function."""
+        fn = os.path.join(self.output_dir.name, "input.impute2")
+        with open(fn, "w") as o_file:
+            o_file.write("".join(self.lines))
+
+        file_index = index.generate_index(
+            fn, cols=[0, 1, 2], names=["chrom", "name", "pos"], sep=" ",
+        )
+        self._check_index(fn, file_index)
+        self.assertEqual(np.uint64, file_index.seek.dtype)
+
+        # The index should have been written
+        self.assertTrue(index.has_index(fn))
+        self._check_index(fn, index.get_index(
+            fn, cols=[0, 1, 2], names=["chrom", "name", "pos"], sep=" ",
+        ))
+
+    def test_generate_index_dtypes(self):
+        """Tests the 'generate_index' function (with data types)."""
+        fn = os.path.join(self.output_dir.name, "input.impute2")
+        with open(fn, "w") as o_file:
+            o_file.write("".join(self.lines))
+
+        file_index = index.generate_index(
+            fn, cols=[0, 1, 2], names=["chrom", "name", "pos"], sep=" ",
+            dtypes={"chrom": "category", "name": str, "pos": "int32"},
+        )
+        self._check_index(fn, file_index)
+        self.assertEqual("category", file_index.chrom.dtype.name)
+        self.assertEqual(["1", "2", "3", "4"],
+                         list(file_index.chrom.cat.categories))
+        self.assertEqual(np.int32, file_index.pos.dtype)
+
+    def test_generate_index_no_final_new_line(self):
+        """Tests the 'generate_index' function (no final new line)."""
+        fn = os.path.join(self.output_dir.name, "input.impute2")
+        with open(fn, "w") as o_file:
+            o_file.write("".join(self.lines).rstrip("\n"))
+        self.lines[-1] = self.lines[-1].rstrip("\n")
+
+        file_index = index.generate_index(
+            fn, cols=[0, 1, 2], names=["chrom", "name", "pos"], sep=" ",
+        )
+        self._check_index(fn, file_index)
+
+    @unittest.skipIf(not index.HAS_BIOPYTHON, "requires BioPython")
+    def test_generate_index_bgzip(self):
+        """Tests the 'generate_index' function (bgzip file)."""
+        from Bio.bgzf import BgzfWriter
+
+        fn = os.path.join(self.output_dir.name, "input.impute2.gz")
+        with BgzfWriter(fn, "wb") as o_file:
+            o_file.write("".join(self.lines).encode())
+
+        file_index = index.generate_index(
+            fn, cols=[0, 1, 2], names=["chrom", "name", "pos"], sep=" ",
+        )
+        self._check_index(fn, file_index)
+
+        # The seek positions are virtual offsets (over multiple blocks)
+        self.assertTrue(np.any(file_index.seek.values >> np.uint64(16) > 0))
+
+        # They should be the same as the ones told by BGZF
+        with index.BgzfReader(fn, "rb") as i_file:
+            expected = [0]
+            for line in self.lines[:-1]:
+                i_file.readline()
+                expected.append(i_file.tell())
+        self.assertEqual(expected, file_index.seek.tolist())
+
+    @unittest.skipIf(not index.HAS_BIOPYTHON, "requires BioPython")
+    @patch.object(index, "HAS_BGZF_BLOCKS", False)
+    def test_generate_index_bgzip_no_blocks(self):
+        """Tests the 'generate_index' function (bgzip, no block reading)."""
+        from Bio.bgzf import BgzfWriter
+
+        fn = os.path.join(self.output_dir.name, "input.impute2.gz")
+        with BgzfWriter(fn, "wb") as o_file:
+            o_file.write("".join(self.lines).encode())
+
+        file_index = index.generate_index(
+            fn, cols=[0, 1, 2], names=["chrom", "name", "pos"], sep=" ",
+        )
+        self._check_index(fn, file_index)
+        self.assertEqual(np.uint64, file_index.seek.dtype)
+
+    @unittest.skipIf(not index.HAS_BIOPYTHON, "requires BioPython")
+    def test_generate_index_bgzip_block_end(self):
+        """Tests the 'generate_index' function (line at the end of block)."""
+        from Bio.bgzf import BgzfWriter
+
+        # A line ending at the end of the first block (of 65536 bytes)
+        self.lines = self.lines[:1000]
+        size = sum(len(line) for line in self.lines)
+        self.lines.append("1 marker_last 1 A G {}\n".format(
+            "0" * (65536 - size - 21),
+        ))
+        self.assertEqual(65536, sum(len(line) for line in self.lines))
+        self.lines.append(self.lines[0])
+
+        fn = os.path.join(self.output_dir.name, "input.impute2.gz")
+        with BgzfWriter(fn, "wb") as o_file:
+            o_file.write("".join(self.lines).encode())
+
+        file_index = index.generate_index(
+            fn, cols=[0, 1, 2], names=["chrom", "name", "pos"], sep=" ",
+        )
+        self._check_index(fn, file_index)
+
+        # The last line starts in the second block
+        self.assertEqual(0, int(file_index.seek.values[-1]) & 0xFFFF)
+        self.assertTrue(int(file_index.seek.values[-1]) >> 16 > 0)
+
+    def test_get_open_func(self):
+        """Tests the 'get_open_func' function."""
+        fn = os.path.join(self.output_dir.name, "input.impute2")
+        with open(fn, "w") as o_file:
+            o_file.write("".join(self.lines))
+        self.assertEqual((False, open),
+                         index.get_open_func(fn, return_fmt=True))
+
+        # A gzip file (not bgzip)
+        fn = os.path.join(self.output_dir.name, "input.impute2.gz")
+        with gzip.open(fn, "wt") as o_file:
+            o_file.write("".join(self.lines))
+
+        if not index.HAS_BIOPYTHON:
+            with self.assertRaises(GenipeError) as cm:
+                index.get_open_func(fn)
+            self.assertEqual("needs BioPython to index a bgzip file",
+                             cm.exception.message)
+            return
+
+        with self.assertRaises(GenipeError) as cm:
+            index.get_open_func(fn)
+        self.assertEqual("{}: use bgzip for compression...".format(fn),
+                         cm.exception.message)
+
+    def _check_index_io(self, fn, check_string):
+        """Writes and reads back an index."""
+        expected = pd.DataFrame({
+            "chrom": [1, 1, 2], "name": ["m1", "m2", "m3"],
+            "pos": [100, 200, 300], "seek": [0, 10, 20],
+        })
+        index.write_index(fn, expected)
+
+        with open(fn, "rb") as i_file:
+            self.assertEqual(check_string, i_file.read(len(check_string)))
+
+        observed = index.read_index(fn)
+        self.assertEqual(expected.to_dict("list"), observed.to_dict("list"))
+
+    @patch.object(index, "HAS_PYARROW", False)
+    @patch.object(index, "HAS_ZSTD", False)
+    def test_write_read_index_zlib(self):
+        """Tests the 'write_index' and 'read_index' functions (zlib)."""
+        fn = os.path.join(self.output_dir.name, "input.impute2.idx")
+        # The check string is followed by the zlib header
+        self._check_index_io(fn, index._CHECK_STRING + b"x")
+
+        # A zstandard index can't be read without zstandard
+        with open(fn, "wb") as o_file:
+            o_file.write(index._CHECK_STRING_V2 + b"dummy")
+        with self.assertRaises(GenipeError) as cm:
+            index.read_index(fn)
+        self.assertEqual(
+            "{}: needs zstandard to read the index (delete it to "
+            "reindex)".format(fn),
+            cm.exception.message,
+        )
+
+        # An Arrow index can't be read without pyarrow
+        with open(fn, "wb") as o_file:
+            o_file.write(index._CHECK_STRING_V3 + b"dummy")
+        with self.assertRaises(GenipeError) as cm:
+            index.read_index(fn)
+        self.assertEqual(
+            "{}: needs pyarrow to read the index (delete it to "
+            "reindex)".format(fn),
+            cm.exception.message,
+        )
+
+    @unittest.skipIf(not index.HAS_ZSTD, "requires zstandard")
+    @patch.object(index, "HAS_PYARROW", False)
+    def test_write_read_index_zstd(self):
+        """Tests the 'write_index' and 'read_index' functions (zstandard)."""
+        fn = os.path.join(self.output_dir.name, "input.impute2.idx")
+        self._check_index_io(fn, index._CHECK_STRING_V2)
+
+        # A zlib index should still be readable
+        with patch.object(index, "HAS_ZSTD", False):
+            index.write_index(fn, pd.DataFrame({"seek": [0, 10]}))
+        self.assertEqual([0, 10], index.read_index(fn).seek.tolist())
+
+    @unittest.skipIf(not index.HAS_PYARROW, "requires pyarrow")
+    def test_write_read_index_arrow(self):
+        """Tests the 'write_index' and 'read_index' functions (Arrow)."""
+        fn = os.path.join(self.output_dir.name, "input.impute2.idx")
+        self._check_index_io(fn, index._CHECK_STRING_V3)
+
+        # The data types should be kept
+        expected = pd.DataFrame({"seek": np.array([0, 10], dtype=np.uint64)})
+        index.write_index(fn, expected)
+        self.assertEqual(np.uint64, index.read_index(fn).seek.dtype)
+
+        # A CSV index should still be readable
+        with patch.object(index, "HAS_PYARROW", False):
+            index.write_index(fn, pd.DataFrame({"seek": [0, 10]}))
+        self.assertEqual([0, 10], index.read_index(fn).seek.tolist())
+
+    def test_get_index_unreadable(self):
+        """Tests the 'get_index' function (index that can't be read)."""
+        fn = os.path.join(self.output_dir.name, "input.impute2")
+        with open(fn, "w") as o_file:
+            o_file.write("".join(self.lines))
+
+        for check_string in (index._CHECK_STRING_V2, index._CHECK_STRING_V3):
+            # An index written with a missing optional dependency
+            with open(index.get_index_fn(fn), "wb") as o_file:
+                o_file.write(check_string + b"dummy")
+
+            with patch.object(index, "HAS_PYARROW", False), \
+                    patch.object(index, "HAS_ZSTD", False):
+                with self.assertLogs(level="WARNING") as cm:
+                    file_index = index.get_index(
+                        fn, cols=[0, 1, 2], names=["chrom", "name", "pos"],
+                        sep=" ",
+                    )
+                self._check_index(fn, file_index)
+
+                # The index should have been rewritten (readable)
+                self._check_index(fn, index.read_index(
+                    index.get_index_fn(fn),
+                ))
+
+            self.assertEqual(
+                ["WARNING:root:{}: index can't be read (missing optional "
+                 "dependency): reindexing".format(fn)],
+                cm.output,
+            )
+
+    def test_check_strings(self):
+        """Tests the check strings of the index formats."""
+        # Older versions only check the original check string, so the newer
+        # ones shouldn't start with it
+        for check_string in (index._CHECK_STRING_V2, index._CHECK_STRING_V3):
+            self.assertFalse(check_string.startswith(index._CHECK_STRING))
+
+    def test_read_index_invalid(self):
+        """Tests the 'read_index' function (invalid file)."""
+        fn = os.path.join(self.output_dir.name, "input.impute2.idx")
+        with open(fn, "wb") as o_file:
+            o_file.write(b"GENIPE INDEX")
+        with self.assertRaises(GenipeError) as cm:
+            index.read_index(fn)
+        self.assertEqual("{}: not a valid index file".format(fn),
+                         cm.exception.message)
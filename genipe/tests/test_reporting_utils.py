@@ -19,6 +19,26 @@ __all__ = ["TestReportingUtils"]
 
 class TestReportingUtils(unittest.TestCase):
 
+    def test_config_jinja2_filters(self):
+        """Tests the filters of the 'config_jinja2' environment."""
+        env = report_utils.config_jinja2()
+
+        # Sanitizing and formatting
+        template = env.from_string(r'\VAR{ text|sanitize|textbf }')
+        self.assertEqual(r"\textbf{50\% \& more}",
+                         template.render(text="50% & more"))
+
+        # Formatting unsanitized text
+        template = env.from_string(r'\VAR{ text|texttt }')
+        with self.assertRaises(AssertionError) as cm:
+            template.render(text="50%")
+        self.assertEqual(str(cm.exception), "text not sanitized")
+
+        # Wrapping
+        template = env.from_string(r'\VAR{ text|wrap }')
+        self.assertEqual(report_utils.wrap_tex(". " * 80),
+                         template.render(text=". " * 80))
+
     def test_sanitize_tex(self):
         """Tests the 'sanitize_tex' function."""
         # Sanitize all required characters
@@ -34,6 +34,11 @@ __copyright__ = "Copyright 2014, Beaulieu-Saucier Pharmacogenomics Centre"
 __license__ = "Attribution-NonCommercial 4.0 International (CC BY-NC 4.0)"
 
 
+# The data type of the columns kept in the index (so that pandas doesn't need
+# to infer them)
+_INDEX_DTYPES = {"chrom": "category", "name": str, "pos": "int32"}
+
+
 def main(args=None):
     """The main function.
 
@@ -140,7 +145,7 @@ def index_file(fn):
     """
     # For each input file
     index.get_index(fn, cols=[0, 1, 2], names=["chrom", "name", "pos"],
-                    sep=" ")
+                    sep=" ", dtypes=_INDEX_DTYPES)
 
 
 def extract_markers(fn, to_extract, out_prefix, out_format, prob_t, is_long):
@@ -199,7 +204,8 @@ def extract_markers(fn, to_extract, out_prefix, out_format, prob_t, is_long):
 
     # Finding the name of the file containing the index
     file_index = index.get_index(fn, cols=[0, 1, 2],
-                                 names=["chrom", "name", "pos"], sep=" ")
+                                 names=["chrom", "name", "pos"], sep=" ",
+                                 dtypes=_INDEX_DTYPES)
 
     # Keeping only required values from the index
     file_index = file_index[file_index.name.isin(to_extract)]